@@ -0,0 +1,93 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+# The map of streamlit_app.py only changes when data/pg_GDP_map.csv changes, so the figure of every year is built once
+# here and stored in data/pg_GDP_map.json. The app only looks up the figure of the selected year.
+
+# To rebuild the figures after the data set has changed, run in a terminal: python build_map.py
+
+SOURCE = 'data/pg_GDP_map.csv'
+ARTIFACT = 'data/pg_GDP_map.json'
+
+# Gray represents countries with no available data.
+COLOR_SCALE = [[0, 'gray'], [0.01, 'gray'], [0.01, 'blue'], [1, 'red']]
+
+
+def build_figure(df_year, year, max_pg_gdp):
+    """Create the choropleth figure of a single year, returns it as a json compatible dictionary."""
+    fig = px.choropleth(df_year,
+                        # Iso-alpha-3 codes to signify which country
+                        locations='iso_alpha',
+                        color='index',
+                        hover_name='country',
+                        color_continuous_scale=COLOR_SCALE,
+                        projection='miller',
+                        range_color=(0, max_pg_gdp),
+                        scope='europe'
+                        )
+
+    # Sets hover data, the hovertemplate is only an array for years with countries without data
+    hovertemplate = np.select([df_year['index'] == 0],
+                              ['<b>Country: </b> %{customdata}<br><br>No data available'],
+                              '<b>Country: </b>%{customdata}<br><br><b>Index value: </b>%{z}')
+    if (hovertemplate == hovertemplate[0]).all():
+        hovertemplate = hovertemplate[0]
+
+    # The country names are shown through customdata, so the hover text of hover_name is not needed
+    fig.update_traces(customdata=df_year['country'], hovertemplate=hovertemplate, hovertext=None)
+
+    # Gets value for the entire EU
+    numb = df_year.query('country=="EU"')['index'].tolist()
+    eu_index = str(numb[0]) if numb else 'no data available'
+
+    # Set title and EU index
+    fig.update_layout(title='<b>Volume of passengers relative to GDP in ' + str(year)
+                            + ' (2015 base year)</b><br>EU index: ' + eu_index,
+                      coloraxis_colorbar=dict(x=0,
+                                              y=0.5)
+                      )
+
+    # Set figure size
+    fig.update_layout(width=1000,
+                      height=600)
+
+    # The default template is added again when the app creates the figure
+    fig.layout.template = None
+
+    return json.loads(pio.to_json(fig, validate=False))
+
+
+def build(source=SOURCE, artifact=ARTIFACT):
+    """Build the figure of every year from the prepared data set and store them in a json file."""
+    # Read in prepared data set, rename a column and extract the different years
+    df = pd.read_csv(source)
+    df = df.rename(columns={'pg_GDP': 'index'})
+    years = df['year'].unique()
+
+    # Calculate max value for continuous colour range, shared by all years
+    max_pg_gdp = df['index'].max()
+
+    figures = {str(year): build_figure(df[df['year'] == year], year, max_pg_gdp) for year in years}
+
+    with open(artifact, 'w', encoding='utf-8') as file:
+        json.dump({'years': [int(year) for year in years], 'figures': figures}, file, separators=(',', ':'))
+
+
+def version(artifact=ARTIFACT):
+    """Return a key which changes whenever the stored figures change, the app caches the figures on it."""
+    return os.stat(artifact).st_mtime_ns
+
+
+def load(artifact=ARTIFACT):
+    """Read the stored figures of all years, these are only rebuilt by running this file."""
+    with open(artifact, encoding='utf-8') as file:
+        return json.load(file)
+
+
+if __name__ == '__main__':
+    build()
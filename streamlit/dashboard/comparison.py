@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dashboard.metrics import METRICS, evaluate
+from dashboard.query import dataset_version
+from dashboard.series import store
+
+# The "compared to other countries" histograms compare every country to the selected country in the selected year.
+# Instead of recomputing that on every selection, the comparison of every country to every other country in every
+# year is computed at once with numpy broadcasting, so a selection is a slice of it.
+
+
+@st.cache_resource(max_entries=4)
+def relative_difference_cube(name, version):
+    """Compute a country x country x year cube of a metric with a reference, e.g. Percentage_change_inj_pop.
+
+    cube[i, j, k] compares country j to country i in year k. It is stored as float32 with NaN where either country
+    has no data. The cube is shared by all sessions without copying, so it is read-only.
+    """
+    metric = METRICS[name]
+    series = store(metric.table)
+
+    # Dense country x year matrix of the compared column
+    matrix = series.values[metric.reference]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cube = evaluate(name, **{metric.reference: matrix[np.newaxis, :, :], 'reference': matrix[:, np.newaxis, :]})
+
+    # Comparing to a country with a value of zero has no meaning either
+    cube[~np.isfinite(cube)] = np.nan
+
+    cube = cube.astype(np.float32)
+    cube.flags.writeable = False
+
+    return series.countries, list(series.years), cube
+
+
+def relative_difference(name, country, year):
+    """Return a metric with a reference of every country compared to a country in a year, indexed by country."""
+    countries, years, cube = relative_difference_cube(name, dataset_version(METRICS[name].table))
+    return pd.Series(cube[countries.index(country), :, years.index(year)], index=countries)
+
+
+def pairwise(name, year):
+    """Return the country x country comparison of a year, without countries that have no data in that year."""
+    countries, years, cube = relative_difference_cube(name, dataset_version(METRICS[name].table))
+    matrix = cube[:, :, years.index(year)]
+
+    available = ~np.isnan(matrix).all(axis=0)
+    return pd.DataFrame(matrix[np.ix_(available, available)],
+                        index=np.array(countries)[available],
+                        columns=np.array(countries)[available])
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pandas as pd
+
+# Road expenditures are in local currency, which makes them impossible to compare between countries. This stage
+# converts them once to constant-price, PPP-adjusted US dollars and stores the results as extra columns of
+# road_expenditures.csv, so the pages do not have to convert anything.
+#
+# It needs two tables from the OECD, exported as csv with (at least) the columns LOCATION, TIME and Value:
+#   ppp.csv       purchasing power parities for GDP, national currency per US dollar
+#   deflator.csv  GDP deflator, an index of the price level per year
+# An export usually holds several series per country and year, so only the rows of the series below are used. The code
+# columns which are not in an export are not filtered on, but every table must end up with one row per country and
+# year.
+#
+# An amount is first brought to the prices of the base year with the deflator, and then converted to US dollars with
+# the PPP of the base year:
+#   amount * deflator[base year] / deflator[year] / ppp[base year]
+
+DATA_DIR = 'streamlit/data'
+EXPENDITURES_FILE = 'streamlit/data/app_data/road_expenditures.csv'
+SAFETY_FILE = 'streamlit/data/app_data/road_safety.csv'
+
+BASE_YEAR = 2015
+
+# Codes of the series used from the OECD tables (national accounts, table 4 and table 1)
+PPP_SERIES = {'TRANSACT': 'PPPGDP', 'MEASURE': 'CD'}
+DEFLATOR_SERIES = {'TRANSACT': 'B1_GE', 'MEASURE': 'DOB'}
+
+# Columns added to road_expenditures.csv
+COLUMNS = ['Maintenance_USD', 'Investments_USD', 'Cost_Sum_USD', 'Cost_Sum_USD_per_capita', 'Cost_Sum_USD_per_pkm']
+
+
+def read_oecd(path, name, series):
+    """Read a series of an OECD table into the columns Location, Year and the given name."""
+    df = pd.read_csv(path, encoding='utf-8-sig')
+
+    for column, code in series.items():
+        if column in df.columns:
+            df = df[df[column] == code]
+
+    return df[['LOCATION', 'TIME', 'Value']].rename(columns={'LOCATION': 'Location', 'TIME': 'Year', 'Value': name})
+
+
+def _check_unique(df, name):
+    # Several values for a location and year would multiply the rows of the merge below
+    duplicates = df[df.duplicated(['Location', 'Year'], keep=False)]
+    if not duplicates.empty:
+        raise ValueError('More than one ' + name + ' value for ' + str(len(duplicates)) + ' rows, e.g. '
+                         + ', '.join(duplicates['Location'].astype(str).unique()[:5])
+                         + '. Select a single series with the series codes.')
+
+
+def conversion_factors(df_ppp, df_deflator, base_year=BASE_YEAR):
+    """Return per location and year the factor that converts local currency to constant-price PPP US dollars."""
+    _check_unique(df_ppp, 'PPP')
+    _check_unique(df_deflator, 'Deflator')
+
+    df = df_deflator.merge(df_ppp, on=['Location', 'Year'], how='left')
+
+    # Deflator and PPP of the base year of every location
+    base = df[df['Year'] == base_year].set_index('Location')
+    df['Factor'] = (df['Location'].map(base['Deflator']) / df['Deflator']) / df['Location'].map(base['PPP'])
+
+    return df[['Location', 'Year', 'Factor']]
+
+
+def convert(df_exp, df_safety, factors):
+    """Add the constant-price PPP US dollar columns to the road expenditures, for all countries and years at once."""
+    # Drop the results of an earlier run
+    df = df_exp.drop(columns=[column for column in COLUMNS if column in df_exp.columns])
+
+    factor = df[['Location', 'Year']].merge(factors, on=['Location', 'Year'], how='left')['Factor'].to_numpy()
+    safety = df[['Country', 'Year']].merge(df_safety[['Country', 'Year', 'Population', 'Passenger_kilometres']],
+                                           on=['Country', 'Year'], how='left')
+
+    df['Maintenance_USD'] = df['Maintenance'] * factor
+    df['Investments_USD'] = df['Investments'] * factor
+    df['Cost_Sum_USD'] = df['Maintenance_USD'] + df['Investments_USD']
+    df['Cost_Sum_USD_per_capita'] = df['Cost_Sum_USD'] / safety['Population'].to_numpy()
+    # Passenger kilometres are in millions
+    df['Cost_Sum_USD_per_pkm'] = df['Cost_Sum_USD'] / (safety['Passenger_kilometres'].to_numpy() * 1e6)
+
+    return df
+
+
+def run(data_dir=DATA_DIR, expenditures_file=EXPENDITURES_FILE, safety_file=SAFETY_FILE, base_year=BASE_YEAR):
+    """Convert the road expenditures with the PPP and deflator tables and store them in road_expenditures.csv."""
+    factors = conversion_factors(read_oecd(os.path.join(data_dir, 'ppp.csv'), 'PPP', PPP_SERIES),
+                                 read_oecd(os.path.join(data_dir, 'deflator.csv'), 'Deflator', DEFLATOR_SERIES),
+                                 base_year)
+
+    df = convert(pd.read_csv(expenditures_file), pd.read_csv(safety_file), factors)
+    df.to_csv(expenditures_file, index=False)
+
+
+# To convert the expenditures, run in a terminal: python streamlit/dashboard/currency.py [base year]
+if __name__ == '__main__':
+    run(base_year=int(sys.argv[1]) if len(sys.argv) > 1 else BASE_YEAR)
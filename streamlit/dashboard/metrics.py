@@ -0,0 +1,69 @@
+import collections
+
+# Registry of the derived metrics used on the pages. Every metric is declared once with its formula, the columns it
+# depends on and the format it is displayed with, so the pages refer to it by name instead of repeating the column
+# arithmetic. Every metric has its formula in SQL, used by DuckDB, and the same formula as a function of numpy arrays
+# with the dependencies as keyword arguments.
+#
+# Metrics without a reference are materialized as columns when the tables are loaded (see dashboard.query). Metrics
+# with a reference compare every row to the value of the reference column of another row, e.g. the selected country,
+# these are computed for all pairs of rows at once (see dashboard.comparison).
+
+Metric = collections.namedtuple('Metric', ['name', 'table', 'formula', 'function', 'dependencies', 'format',
+                                           'reference'])
+
+METRICS = {}
+
+
+def register(name, table, formula, function, dependencies, format, reference=None):
+    """Declare a derived metric of a table."""
+    METRICS[name] = Metric(name, table, formula, function, dependencies, format, reference)
+
+
+# Percentage of total government expenditures spend on road infrastructure
+register('Perc_Cost_Sum', 'road_expenditures', 'Perc_Maintenance + Perc_Investments',
+         lambda Perc_Maintenance, Perc_Investments: Perc_Maintenance + Perc_Investments,
+         ['Perc_Maintenance', 'Perc_Investments'], ',.2f')
+
+# Total road infrastructure expenditures in local currency
+register('Cost_Sum', 'road_expenditures', 'Maintenance + Investments',
+         lambda Maintenance, Investments: Maintenance + Investments,
+         ['Maintenance', 'Investments'], ',.0f')
+
+# Percentage change compared to the selected country
+register('Percentage_change_inj_pop', 'road_safety', '(Percentage_inj_pop / reference - 1) * 100',
+         lambda Percentage_inj_pop, reference: (Percentage_inj_pop / reference - 1) * 100,
+         ['Percentage_inj_pop'], ',.1f', reference='Percentage_inj_pop')
+register('Percentage_change_inj_pk_pop', 'road_safety', '(Percentage_inj_pk_pop / reference - 1) * 100',
+         lambda Percentage_inj_pk_pop, reference: (Percentage_inj_pk_pop / reference - 1) * 100,
+         ['Percentage_inj_pk_pop'], ',.1f', reference='Percentage_inj_pk_pop')
+
+
+def materialized(table):
+    """Return the metrics of a table which are stored as columns, ordered so dependencies come first."""
+    metrics = [metric for metric in METRICS.values() if metric.table == table and metric.reference is None]
+    names = {metric.name for metric in metrics}
+
+    ordered = []
+    done = set()
+    while metrics:
+        ready = [metric for metric in metrics
+                 if all(dependency in done or dependency not in names for dependency in metric.dependencies)]
+        if not ready:
+            raise ValueError('Circular dependency between the metrics of ' + table)
+        for metric in ready:
+            ordered.append(metric)
+            done.add(metric.name)
+            metrics.remove(metric)
+
+    return ordered
+
+
+def evaluate(name, **arrays):
+    """Compute a metric from numpy arrays of its dependencies (and reference), broadcasting them against each other."""
+    return METRICS[name].function(**arrays)
+
+
+def hover(name, field):
+    """Return the hovertemplate field showing a metric in its display format, e.g. %{x:,.2f}."""
+    return '%{' + field + ':' + METRICS[name].format + '}'
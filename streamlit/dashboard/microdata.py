@@ -0,0 +1,116 @@
+import os
+import sys
+
+import pandas as pd
+
+# Crash-level microdata has a row per crash, which is millions of rows per year. Instead of loading those files, they
+# are read in chunks and summed into cubes of injuries & deaths per country, region and month. Only the cubes are
+# stored, so the pages can drill down into regions and months without touching the raw rows.
+#
+# A microdata file is a csv with the columns:
+#   Date        date of the crash, e.g. 2019-05-21
+#   Location    iso-alpha-3 code of the country, e.g. BEL
+#   Region      region within the country
+#   Severity    e.g. fatal, serious or slight
+#   Road_type   e.g. motorway, rural or urban
+#   Casualties  injured + killed in the crash (optional, every row counts as one casualty without it)
+
+CUBE_DIR = 'streamlit/data/app_data/cubes'
+SAFETY_FILE = 'streamlit/data/app_data/road_safety.csv'
+
+# Dimensions kept in the base cube, the other cubes are roll-ups of it
+DIMENSIONS = ['Year', 'Month', 'Location', 'Region', 'Severity', 'Road_type']
+
+# Roll-ups of the base cube, these have the same columns as road_safety.csv where the granularity allows it
+CUBES = {
+    'country_year': ['Year', 'Location'],
+    'country_month': ['Year', 'Month', 'Location'],
+    'region_month': ['Year', 'Month', 'Location', 'Region'],
+}
+
+
+def aggregate_chunk(chunk):
+    """Sum the casualties of a chunk of crash rows per base cube dimension."""
+    dates = pd.to_datetime(chunk['Date'], errors='coerce')
+    casualties = chunk['Casualties'] if 'Casualties' in chunk else pd.Series(1, index=chunk.index)
+
+    df = pd.DataFrame({'Year': dates.dt.year,
+                       'Month': dates.dt.month,
+                       'Location': chunk['Location'],
+                       'Region': chunk['Region'].fillna('Unknown'),
+                       'Severity': chunk['Severity'].fillna('Unknown'),
+                       'Road_type': chunk['Road_type'].fillna('Unknown'),
+                       'Injuries': casualties.fillna(0)
+                       })
+
+    # Crashes without a valid date or country cannot be put in a cube
+    df.dropna(subset=['Year', 'Location'], inplace=True)
+    df[['Year', 'Month']] = df[['Year', 'Month']].astype(int)
+
+    return df.groupby(DIMENSIONS)['Injuries'].sum()
+
+
+def ingest(paths, chunksize=500_000):
+    """Stream one or more microdata files and return the base cube.
+
+    Memory is bounded by the chunk size and the amount of distinct dimension combinations, not by the amount of rows.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    columns = ['Date', 'Location', 'Region', 'Severity', 'Road_type', 'Casualties']
+    cube = None
+
+    for path in paths:
+        for chunk in pd.read_csv(path,
+                                 chunksize=chunksize,
+                                 usecols=lambda column: column in columns,
+                                 dtype={'Location': str, 'Region': str, 'Severity': str, 'Road_type': str}
+                                 ):
+            sums = aggregate_chunk(chunk)
+            cube = sums if cube is None else cube.add(sums, fill_value=0)
+
+    if cube is None:
+        return pd.DataFrame(columns=DIMENSIONS + ['Injuries'])
+    return cube.reset_index()
+
+
+def roll_up(base, dimensions, df_safety):
+    """Sum the base cube over all dimensions but the given ones and add the road_safety.csv columns."""
+    df = base.groupby(dimensions, as_index=False)['Injuries'].sum()
+
+    # Country names and yearly passenger kilometres come from the national data
+    countries = df_safety[['Location', 'Country']].drop_duplicates()
+    df = df.merge(countries, on='Location', how='left')
+
+    # Passenger kilometres are only known per country and year, so only that cube gets injuries per passenger km
+    if dimensions == CUBES['country_year']:
+        df = df.merge(df_safety[['Year', 'Location', 'Passenger_kilometres']], on=['Year', 'Location'], how='left')
+        df['Injuries_passenger_kilometres'] = df['Injuries'] / df['Passenger_kilometres'] * 1000
+    else:
+        df['Injuries_passenger_kilometres'] = float('nan')
+
+    return df
+
+
+def write_cubes(base, directory=CUBE_DIR, safety_file=SAFETY_FILE):
+    """Store the base cube and its roll-ups as csv files."""
+    os.makedirs(directory, exist_ok=True)
+    df_safety = pd.read_csv(safety_file)
+
+    base.to_csv(os.path.join(directory, 'base.csv'), index=False)
+    for name, dimensions in CUBES.items():
+        roll_up(base, dimensions, df_safety).to_csv(os.path.join(directory, name + '.csv'), index=False)
+
+
+def load_cube(name, directory=CUBE_DIR):
+    """Read a stored cube, returns None when no microdata has been ingested."""
+    path = os.path.join(directory, name + '.csv')
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)
+
+
+# To build the cubes, run in a terminal: python streamlit/dashboard/microdata.py crashes_2019.csv crashes_2020.csv
+if __name__ == '__main__':
+    write_cubes(ingest(sys.argv[1:]))
@@ -0,0 +1,255 @@
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import streamlit as st
+
+# Every rerun sends the figures as JSON over the websocket, so on slow connections the size of that JSON decides
+# how long a page takes to show. The functions below measure the figures, slim them before they are sent and warn
+# when a chart or a whole rerun goes over its budget.
+
+logger = logging.getLogger(__name__)
+
+# Budgets in bytes of serialized figure JSON, can be changed with environment variables
+CHART_BUDGET = int(os.environ.get('CHART_PAYLOAD_BUDGET', 150_000))
+RERUN_BUDGET = int(os.environ.get('RERUN_PAYLOAD_BUDGET', 600_000))
+
+# Matches hovertemplate fields such as %{x}, %{customdata[1]:,.0f} and %{marker.color}
+FIELD = re.compile(r'%\{([^:}]+)(?::([^}]*))?\}')
+DECIMALS = re.compile(r'\.(\d+)([f%])')
+
+# Trace attributes holding the plotted values which can be referenced by a hovertemplate
+POSITIONS = ('x', 'y', 'z', 'marker.color')
+
+
+def figure_size(fig):
+    """Return the amount of bytes the figure takes when streamlit sends it to the browser."""
+    return len(pio.to_json(fig, validate=False).encode())
+
+
+def _get(trace, field):
+    # Not every trace type has every attribute, e.g. a choropleth has no x and no marker colour
+    try:
+        return trace[field]
+    except KeyError:
+        return None
+
+
+def _templates(trace):
+    template = trace['hovertemplate']
+    if template is None:
+        return []
+    if isinstance(template, str):
+        return [template]
+    return list(template)
+
+
+def _display_decimals(templates):
+    """Map each field used in the hovertemplates to the decimals it is displayed with (None if unformatted)."""
+    decimals = {}
+    for template in templates:
+        for field, fmt in FIELD.findall(template):
+            match = DECIMALS.search(fmt or '')
+            if match is None:
+                decimals[field] = None
+            elif decimals.get(field, 0) is not None:
+                # Percentages are multiplied by 100 before they are shown, so they need two more decimals
+                shown = int(match.group(1)) + (2 if match.group(2) == '%' else 0)
+                decimals[field] = max(decimals.get(field, 0), shown)
+    return decimals
+
+
+def _same_values(a, b):
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    if a.shape != b.shape:
+        return False
+    # Missing values are sent as null whether they were None or NaN
+    return bool(np.all((a == b) | (pd.isna(a) & pd.isna(b))))
+
+
+def _drop_duplicate_hover(trace, templates):
+    """Remove customdata columns that are already sent as x, y, z or marker colour and point the template to those."""
+    customdata = trace['customdata']
+    if customdata is None:
+        return templates
+
+    # Customdata that is never shown does not have to be sent at all
+    if not any('customdata' in template for template in templates):
+        trace['customdata'] = None
+        return templates
+
+    customdata = np.asarray(customdata)
+    positions = {field: _get(trace, field) for field in POSITIONS}
+    positions = {field: value for field, value in positions.items()
+                 if value is not None and not isinstance(value, str) and np.ndim(value) == 1}
+
+    def duplicate_of(column):
+        for field, value in positions.items():
+            if _same_values(column, value):
+                return field
+        return None
+
+    if customdata.ndim == 1:
+        field = duplicate_of(customdata)
+        if field is None:
+            return templates
+        trace['customdata'] = None
+        return [re.sub(r'%\{customdata(?=[:}])', '%{' + field, template) for template in templates]
+
+    # Work out the new reference for every column, kept columns are renumbered
+    references = {}
+    kept = []
+    for column in range(customdata.shape[1]):
+        field = duplicate_of(customdata[:, column])
+        if field is None:
+            references[column] = 'customdata[' + str(len(kept)) + ']'
+            kept.append(column)
+        else:
+            references[column] = field
+
+    if len(kept) == customdata.shape[1]:
+        return templates
+
+    trace['customdata'] = customdata[:, kept] if kept else None
+    return [re.sub(r'%\{customdata\[(\d+)\]', lambda m: '%{' + references[int(m.group(1))], template)
+            for template in templates]
+
+
+def _round(values, decimals):
+    """Round a float array to the displayed decimals and use float32 when it shows the same numbers."""
+    if decimals is not None:
+        values = np.round(values, decimals)
+    single = values.astype(np.float32)
+
+    if decimals is None:
+        same = np.array_equal(single.astype(values.dtype), values, equal_nan=True)
+    else:
+        same = np.array_equal(np.round(single.astype(values.dtype), decimals), values, equal_nan=True)
+    return single if same else values
+
+
+def _slim_values(values, decimals, position):
+    """Slim an array of values which is displayed with the given decimals."""
+    values = np.asarray(values)
+
+    if values.dtype == object:
+        # Mixed arrays cannot be typed arrays, but rounding the numbers still shortens the JSON
+        if decimals is None:
+            return values
+        rounded = values.copy()
+        for index, value in np.ndenumerate(values):
+            if isinstance(value, (float, np.floating)) and np.isfinite(value):
+                rounded[index] = int(round(value)) if decimals == 0 else round(float(value), decimals)
+        return rounded
+
+    if values.dtype.kind != 'f' or values.dtype.itemsize <= 4:
+        return values
+
+    # Plotted positions are not rounded so points do not move, only the precision they are sent with changes
+    if position:
+        if decimals is None:
+            return values
+        single = values.astype(np.float32)
+        same = np.array_equal(np.round(single.astype(values.dtype), decimals), np.round(values, decimals),
+                              equal_nan=True)
+        return single if same else values
+
+    return _round(values, decimals)
+
+
+def slim_figure(fig):
+    """Shrink the JSON of a figure without changing what is shown.
+
+    Hover columns that are already plotted as x/y are dropped, floats are rounded to the precision they are displayed
+    with and sent as float32 typed arrays where possible, repeated per point hovertemplates are collapsed and the
+    template only keeps the trace defaults of the trace types in the figure.
+    """
+    for trace in fig.data:
+        templates = _drop_duplicate_hover(trace, _templates(trace))
+        decimals = _display_decimals(templates)
+
+        # Collapse per point hovertemplates which are all the same
+        if len(templates) == 1 or (templates and len(set(templates)) == 1):
+            trace['hovertemplate'] = templates[0]
+        elif templates:
+            trace['hovertemplate'] = templates
+
+        for field in ('x', 'y', 'z'):
+            values = _get(trace, field)
+            if values is None or isinstance(values, str):
+                continue
+            values = np.asarray(values)
+            if field in decimals or trace['hovertemplate'] is None:
+                trace[field] = _slim_values(values, decimals.get(field), position=True)
+            elif values.dtype.kind == 'f':
+                # Values which are only plotted and never shown in the hover can always be sent as float32
+                trace[field] = values.astype(np.float32)
+
+        customdata = trace['customdata']
+        if customdata is not None:
+            customdata = np.asarray(customdata)
+            if customdata.ndim == 1:
+                trace['customdata'] = _slim_values(customdata, decimals.get('customdata'), position=False)
+            elif customdata.dtype == object:
+                columns = [_slim_values(customdata[:, column], decimals.get('customdata[' + str(column) + ']'),
+                                        position=False)
+                           for column in range(customdata.shape[1])]
+                trace['customdata'] = np.stack(columns, axis=-1).astype(object)
+            else:
+                # A numeric 2D array is a single typed array, so every column has to fit the same dtype
+                columns = [_slim_values(customdata[:, column], decimals.get('customdata[' + str(column) + ']'),
+                                        position=False)
+                           for column in range(customdata.shape[1])]
+                trace['customdata'] = np.stack(columns, axis=-1).astype(np.result_type(*columns))
+
+    # Only keep the template trace defaults for the trace types that are actually in the figure
+    template = fig.layout.template
+    if template is not None and template.data is not None:
+        types = {trace.type for trace in fig.data}
+        template.data = {trace_type: defaults for trace_type, defaults in template.data.to_plotly_json().items()
+                         if trace_type in types}
+
+    return fig
+
+
+class PayloadBudget:
+    """Slims, measures and shows the charts of a single page rerun.
+
+    Create one at the top of a page and show charts with its plotly_chart method instead of st.plotly_chart.
+    """
+
+    def __init__(self, page, chart_budget=CHART_BUDGET, rerun_budget=RERUN_BUDGET):
+        self.page = page
+        self.chart_budget = chart_budget
+        self.rerun_budget = rerun_budget
+        self.sizes = []
+
+    @property
+    def total(self):
+        return sum(size for _, size in self.sizes)
+
+    def plotly_chart(self, fig, **kwargs):
+        """Slim the figure, check it against the budgets and show it on the page."""
+        slim_figure(fig)
+        size = figure_size(fig)
+        name = fig.layout.title.text or 'chart ' + str(len(self.sizes) + 1)
+        self.sizes.append((name, size))
+
+        logger.debug('%s: %r is %d bytes', self.page, name, size)
+        if size > self.chart_budget:
+            logger.warning('%s: %r is %d bytes, over the chart budget of %d bytes',
+                           self.page, name, size, self.chart_budget)
+        if self.total > self.rerun_budget >= self.total - size:
+            logger.warning('%s: rerun payload is %d bytes after %r, over the rerun budget of %d bytes',
+                           self.page, self.total, name, self.rerun_budget)
+
+        return st.plotly_chart(fig, **kwargs)
+
+    def report(self):
+        """Log the payload of all charts shown in this rerun."""
+        logger.info('%s: %d charts, %d bytes in total', self.page, len(self.sizes), self.total)
+        return self.sizes
@@ -0,0 +1,189 @@
+import collections
+import logging
+import os
+import time
+
+import duckdb
+import streamlit as st
+
+from dashboard.currency import COLUMNS as CURRENCY_COLUMNS
+from dashboard.metrics import materialized
+from dashboard.microdata import CUBE_DIR, CUBES
+
+# The pages get their data through an embedded DuckDB database instead of filtering the csv files with pandas on every
+# rerun. The csv files are loaded once per server process into columnar tables which are shared by all sessions, and
+# every page query is a parameterized statement so filters are pushed down into multi-threaded scans of those tables.
+
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    'road_safety': 'streamlit/data/app_data/road_safety.csv',
+    'road_expenditures': 'streamlit/data/app_data/road_expenditures.csv',
+}
+
+# Columns added by a build step which may not have run yet, these are NULL until it has
+OPTIONAL_COLUMNS = {
+    'road_expenditures': CURRENCY_COLUMNS,
+}
+
+# Columns of every table as stored in its file, before optional columns and metrics are added
+STORED_COLUMNS = {}
+
+# Amount of threads DuckDB may use for a single query, can be changed with an environment variable
+THREADS = int(os.environ.get('QUERY_THREADS', os.cpu_count() or 1))
+
+# Timings of the most recent queries, shown on the Data page
+QUERY_LOG = collections.deque(maxlen=200)
+
+
+def _extremes(metric):
+    # Best and worst country of every year for a metric, ties go to the first country like in the csv
+    return f"""
+        SELECT Year,
+               min({metric}) AS rel_b,
+               first(Country ORDER BY {metric}, Country) AS country_best,
+               max({metric}) AS rel_w,
+               first(Country ORDER BY {metric} DESC, Country) AS country_worst
+        FROM road_safety
+        WHERE {metric} IS NOT NULL
+        GROUP BY Year
+        ORDER BY Year
+    """
+
+
+QUERIES = {
+    # Road safety
+    'safety': 'SELECT * FROM road_safety ORDER BY Country, Year',
+    'safety_years': 'SELECT DISTINCT Year FROM road_safety ORDER BY Year',
+    'safety_countries': 'SELECT DISTINCT Country FROM road_safety ORDER BY Country',
+    'safety_year': 'SELECT * FROM road_safety WHERE Year = $year ORDER BY Country',
+    'safety_country_year': 'SELECT * FROM road_safety WHERE Country = $country AND Year = $year',
+    'safety_others_year': """
+        SELECT * FROM road_safety
+        WHERE Year = $year AND Country <> $country AND Injuries IS NOT NULL
+        ORDER BY Country
+    """,
+    'safety_year_passenger_kilometres': """
+        SELECT * FROM road_safety
+        WHERE Year = $year AND Injuries IS NOT NULL AND Passenger_kilometres IS NOT NULL
+        ORDER BY Country
+    """,
+    'safety_extremes_pop': _extremes('Percentage_inj_pop'),
+    'safety_extremes_pk_pop': _extremes('Percentage_inj_pk_pop'),
+
+    # Road expenditures
+    'expenditures': 'SELECT * FROM road_expenditures ORDER BY Country, Year',
+    'expenditures_years': 'SELECT DISTINCT Year FROM road_expenditures ORDER BY Year',
+    'expenditures_countries': 'SELECT DISTINCT Country FROM road_expenditures ORDER BY Country',
+    'expenditures_year': """
+        SELECT * FROM road_expenditures
+        WHERE Year = $year
+        ORDER BY Country
+    """,
+    'expenditures_year_percentages': """
+        SELECT * FROM road_expenditures
+        WHERE Year = $year AND Perc_Maintenance IS NOT NULL AND Perc_Investments IS NOT NULL
+        ORDER BY Country
+    """,
+
+    # Crash-level microdata, only available when the cubes have been built (see dashboard.microdata)
+    'crashes_region_month': """
+        SELECT * FROM crashes_region_month
+        WHERE Country = $country AND Year = $year
+        ORDER BY Month, Region
+    """,
+
+    # Road safety joined with road expenditures, Location is missing in road_safety.csv for countries without
+    # injury data so the tables are joined on country name
+    'relation': """
+        SELECT s.Year, s.Country, s.Population, s.Injuries_passenger_kilometres, s.Percentage_inj_pk_pop,
+               e.Perc_Maintenance, e.Perc_Investments, e.Maintenance, e.Investments, e.Perc_Cost_Sum, e.Cost_Sum,
+               e.Cost_Sum_USD, e.Cost_Sum_USD_per_capita, e.Cost_Sum_USD_per_pkm
+        FROM road_safety s JOIN road_expenditures e USING (Year, Country)
+        ORDER BY s.Country, s.Year
+    """,
+}
+
+# The relation query filtered on a single country
+QUERIES['relation_country'] = QUERIES['relation'].replace('ORDER BY', 'WHERE s.Country = $country\n        ORDER BY')
+
+
+@st.cache_resource(max_entries=1)
+def connect(versions):
+    """Load the datasets and microdata cubes into an in-memory DuckDB database, returns the connection."""
+    con = duckdb.connect(':memory:')
+    con.execute('SET threads = ' + str(THREADS))
+
+    tables = dict(TABLES)
+    # Crash-level microdata cubes, when they have been built
+    for name in ['base'] + list(CUBES):
+        path = os.path.join(CUBE_DIR, name + '.csv')
+        if os.path.exists(path):
+            tables['crashes_' + name] = path
+
+    for table, path in tables.items():
+        start = time.perf_counter()
+        con.execute(f"CREATE TABLE {table} AS SELECT * FROM read_csv_auto('{path}', header = true)")
+
+        columns = set(con.table(table).columns)
+        STORED_COLUMNS[table] = con.table(table).columns
+        for column in OPTIONAL_COLUMNS.get(table, []):
+            if column not in columns:
+                con.execute(f'ALTER TABLE {table} ADD COLUMN {column} DOUBLE')
+
+        # Derived metrics are computed once here instead of on every rerun
+        for metric in materialized(table):
+            con.execute(f'ALTER TABLE {table} ADD COLUMN {metric.name} DOUBLE')
+            con.execute(f'UPDATE {table} SET {metric.name} = {metric.formula}')
+
+        logger.info('Loaded %s in %.1f ms', table, (time.perf_counter() - start) * 1000)
+
+    return con
+
+
+def dataset_version(table):
+    """Return a key which changes whenever the file of a table changes.
+
+    The cached functions computing results from a table take its version as an argument which is only used as cache
+    key, so their results are computed again from the new data after the file changes. connect takes the versions of
+    all tables, so the datasets are reloaded as well.
+    """
+    stat = os.stat(TABLES[table])
+    return table + ':' + str(stat.st_mtime_ns) + ':' + str(stat.st_size)
+
+
+def _connection():
+    """Return the connection with the current version of the datasets and microdata cubes."""
+    cubes = [os.path.join(CUBE_DIR, name + '.csv') for name in ['base'] + list(CUBES)]
+    return connect(tuple(dataset_version(table) for table in TABLES)
+                   + tuple(str(os.stat(path).st_mtime_ns) for path in cubes if os.path.exists(path)))
+
+
+def stored_columns(table):
+    """Return the columns of a table as they are stored in its file."""
+    _connection()
+    return STORED_COLUMNS[table]
+
+
+def available(table):
+    """Return whether a table has been loaded, e.g. the crashes_* tables which need microdata."""
+    tables = _connection().cursor().execute('SELECT table_name FROM information_schema.tables').fetchall()
+    return (table,) in tables
+
+
+def query(name, **params):
+    """Run a named query with the given parameters and return the result as a dataframe."""
+    # Every call gets its own cursor, so sessions running at the same time do not share a connection
+    cursor = _connection().cursor()
+
+    # Selections taken from a dataframe are numpy scalars, which DuckDB does not accept as parameters
+    params = {key: value.item() if hasattr(value, 'item') else value for key, value in params.items()}
+
+    start = time.perf_counter()
+    df = cursor.execute(QUERIES[name], params).df()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    QUERY_LOG.append({'Query': name, 'Parameters': str(params), 'Rows': len(df), 'Time (ms)': round(elapsed, 2)})
+    logger.debug('Query %s %s returned %d rows in %.2f ms', name, params, len(df), elapsed)
+
+    return df
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the streamlit directory to the path when this file is run as a script, like the pages have it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objs as go  # noqa: E402
+
+from dashboard import comparison, query, series, trends  # noqa: E402
+from dashboard.payload import slim_figure  # noqa: E402
+from dashboard.query import dataset_version  # noqa: E402
+
+# Check of the numbers shown on the pages and of the speed of the functions computing them. The outputs are compared
+# to a stored snapshot within a small tolerance, so a refactor which changes what users see is noticed. Every function
+# is also timed and compared to a stored baseline, a slowdown beyond the threshold fails the check.
+#
+# To check, run in a terminal: python streamlit/dashboard/regression.py
+# To store new baselines after an intended change: python streamlit/dashboard/regression.py --update
+#
+# Timings depend on the machine, so update the timing baselines on the machine which runs the check.
+
+BASELINE_DIR = 'streamlit/data/regression'
+OUTPUTS_FILE = os.path.join(BASELINE_DIR, 'outputs.npz')
+TIMINGS_FILE = os.path.join(BASELINE_DIR, 'timings.json')
+
+# Relative and absolute tolerance of the outputs
+RTOL = 1e-5
+ATOL = 1e-8
+
+# Allowed slowdown compared to the baseline. Most functions take a few ms, where a run can easily be a few ms slower
+# than the other, so slowdowns below MIN_SLOWDOWN ms are seen as noise.
+THRESHOLD = float(os.environ.get('REGRESSION_THRESHOLD', 0.5))
+MIN_SLOWDOWN = 10.0
+
+# Amount of timed runs per function, the median is used. The first run after an import is slower, so every function is
+# run once before it is timed.
+REPEAT = 7
+
+# Columns of the per country series shown on the pages
+SERIES = {
+    'road_safety': ['Injuries', 'Injuries_passenger_kilometres', 'Percentage_inj_pop', 'Percentage_inj_pk_pop'],
+    'road_expenditures': ['Perc_Maintenance', 'Perc_Investments', 'Perc_Cost_Sum', 'Cost_Sum'],
+}
+
+# Series with a trend overlay on the pages
+TRENDS = [('road_safety', 'Injuries'), ('road_safety', 'Injuries_passenger_kilometres'),
+          ('road_expenditures', 'Perc_Maintenance'), ('road_expenditures', 'Perc_Cost_Sum')]
+
+# Metrics compared to the selected country on the Road Safety page
+COMPARISONS = ['Percentage_change_inj_pop', 'Percentage_change_inj_pk_pop']
+
+
+def best_fit_lines():
+    """Coefficients of the best-fit line of passenger kilometres against injuries of every year, like on the Road
+    Safety page."""
+    years = query.query('safety_years')['Year']
+    coefficients = np.full((len(years), 2), np.nan)
+    for i, year in enumerate(years):
+        df = query.query('safety_year_passenger_kilometres', year=year)
+        if len(df) > 1:
+            coefficients[i] = np.polyfit(df['Passenger_kilometres'], df['Injuries'], 1)
+    return coefficients
+
+
+def snapshot():
+    """Compute the outputs the pages depend on, returns a dictionary of named arrays."""
+    outputs = {}
+
+    # Best and worst country of every year
+    for name in ['safety_extremes_pop', 'safety_extremes_pk_pop']:
+        df = query.query(name)
+        for column in df.columns:
+            values = df[column].to_numpy()
+            outputs[name + '/' + column] = values.astype(str) if values.dtype == object else values
+
+    # Derived percentage columns and the series of every country
+    for table, columns in SERIES.items():
+        store = series.store(table)
+        outputs[table + '/countries'] = np.array(store.countries)
+        for column in columns:
+            outputs[table + '/' + column] = store.values[column]
+
+    # Road safety joined with road expenditures on the Relation page
+    df = query.query('relation')
+    for column in ['Injuries_passenger_kilometres', 'Percentage_inj_pk_pop', 'Perc_Cost_Sum', 'Cost_Sum']:
+        outputs['relation/' + column] = df[column].to_numpy(dtype=np.float64)
+
+    # Percentage change of every country compared to every other country
+    for name in COMPARISONS:
+        outputs['comparison/' + name] = comparison.relative_difference_cube(name, dataset_version('road_safety'))[2]
+
+    # Trend coefficients and forecasts
+    for table, column in TRENDS:
+        for method in trends.METHODS:
+            fits = trends.fit_trends(table, column, method, dataset_version(table))
+            outputs['trends/' + column + '/' + method] = fits[['Slope', 'Intercept']].to_numpy()
+        outputs['forecasts/' + column] = trends.forecast_levels(table, column, 0.5, dataset_version(table)).to_numpy()
+
+    outputs['best_fit_lines'] = best_fit_lines()
+
+    return outputs
+
+
+def compare(outputs, baseline):
+    """Return a list with a message for every output which differs from the baseline."""
+    failures = []
+    for name in sorted(set(outputs) | set(baseline)):
+        if name not in baseline:
+            failures.append(name + ': not in the baseline')
+        elif name not in outputs:
+            failures.append(name + ': no longer computed')
+        elif outputs[name].shape != baseline[name].shape:
+            failures.append(name + ': shape ' + str(outputs[name].shape) + ' instead of ' + str(baseline[name].shape))
+        elif outputs[name].dtype.kind in 'US':
+            if not np.array_equal(outputs[name], baseline[name]):
+                failures.append(name + ': values differ')
+        elif not np.allclose(outputs[name], baseline[name], rtol=RTOL, atol=ATOL, equal_nan=True):
+            difference = np.nanmax(np.abs(outputs[name].astype(np.float64) - baseline[name]))
+            failures.append(name + ': values differ, up to ' + str(difference))
+    return failures
+
+
+# Hover formats of which slim_figure must keep the shown values, d3 and python agree on these
+HOVER_FORMATS = ['.0f', ',.1f', ',.5f', '.1%', '.0%']
+
+
+def check_slimming():
+    """Return a list with a message for every hover format of which slim_figure changes the shown values."""
+    values = [0.0123, 0.4567, 12.3456, 1234.56789, 0.000123456]
+    failures = []
+    for fmt in HOVER_FORMATS:
+        fig = go.Figure(go.Bar(x=list(range(len(values))), y=[1] * len(values), customdata=values,
+                               hovertemplate='%{customdata:' + fmt + '}'))
+        slim_figure(fig)
+        shown = [format(float(value), fmt) for value in fig.data[0].customdata]
+        if shown != [format(value, fmt) for value in values]:
+            failures.append('slim_figure changes values shown with ' + fmt + ': ' + ', '.join(shown))
+    return failures
+
+
+def measure(function, *args, cached=None):
+    """Return the median time in ms of a few runs of a function, clearing the cache of a cached function first."""
+    times = []
+    for _ in range(REPEAT + 1):
+        if cached is not None:
+            cached.clear()
+        start = time.perf_counter()
+        function(*args)
+        times.append((time.perf_counter() - start) * 1000)
+
+    # The warm-up run is not timed
+    return float(np.median(times[1:]))
+
+
+def timings():
+    """Time the functions computing the outputs, returns the time in ms per function."""
+    results = {
+        'query.connect': measure(query.connect, tuple(dataset_version(table) for table in query.TABLES),
+                                 cached=query.connect),
+        'query.safety_extremes_pop': measure(query.query, 'safety_extremes_pop'),
+        'query.safety_extremes_pk_pop': measure(query.query, 'safety_extremes_pk_pop'),
+        'query.relation': measure(query.query, 'relation'),
+        'best_fit_lines': measure(best_fit_lines),
+    }
+
+    for table in SERIES:
+        results['series.load_store/' + table] = measure(series.load_store, table, dataset_version(table),
+                                                        cached=series.load_store)
+
+    for name in COMPARISONS:
+        results['comparison.relative_difference_cube/' + name] = measure(
+            comparison.relative_difference_cube, name, dataset_version('road_safety'),
+            cached=comparison.relative_difference_cube)
+
+    for method in trends.METHODS:
+        results['trends.fit_trends/' + method] = measure(trends.fit_trends, 'road_safety', 'Injuries', method,
+                                                         dataset_version('road_safety'), cached=trends.fit_trends)
+    results['trends.forecast_levels'] = measure(trends.forecast_levels, 'road_safety', 'Injuries', 0.5,
+                                                dataset_version('road_safety'), cached=trends.forecast_levels)
+
+    return results
+
+
+def compare_timings(results, baseline, threshold=THRESHOLD):
+    """Return a list with a message for every function which is slower than its baseline beyond the threshold."""
+    failures = []
+    for name, elapsed in results.items():
+        if name not in baseline:
+            continue
+        if elapsed > baseline[name] * (1 + threshold) and elapsed - baseline[name] > MIN_SLOWDOWN:
+            failures.append('%s: %.2f ms instead of %.2f ms' % (name, elapsed, baseline[name]))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the outputs and timings of the pages to the baselines.')
+    parser.add_argument('--update', action='store_true', help='store the current outputs and timings as baselines')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed slowdown, 0.5 is 50%%')
+    parser.add_argument('--skip-timings', action='store_true', help='only compare the outputs')
+    args = parser.parse_args()
+
+    outputs = snapshot()
+    results = {} if args.skip_timings else timings()
+
+    if args.update:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        np.savez_compressed(OUTPUTS_FILE, **outputs)
+        if results:
+            with open(TIMINGS_FILE, 'w') as file:
+                json.dump({name: round(elapsed, 3) for name, elapsed in results.items()}, file, indent=4)
+        print('Stored the baselines in ' + BASELINE_DIR)
+        return 0
+
+    with np.load(OUTPUTS_FILE) as baseline:
+        failures = compare(outputs, dict(baseline))
+    failures += check_slimming()
+
+    if results:
+        with open(TIMINGS_FILE) as file:
+            baseline = json.load(file)
+        for name, elapsed in results.items():
+            print('%-60s %9.2f ms  (baseline %s ms)' % (name, elapsed, baseline.get(name, '-')))
+        failures += compare_timings(results, baseline, args.threshold)
+
+    for failure in failures:
+        print('FAILED ' + failure)
+    print('%d outputs checked, %d failures' % (len(outputs), len(failures)))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dashboard.query import dataset_version, query
+
+# The datasets have a row per country and year. For the per country charts and the vectorized trends, every numeric
+# column is kept as a dense country x year matrix instead, with the countries in alphabetical order and a column for
+# every year from the first to the last year. The series of a country is then a row of the matrix and the position of
+# a year is a fixed offset from the first year, so no filtering of the long format is needed on a rerun. Text columns
+# with a single value per country, like Location, are kept as an array indexed by country.
+
+# Query with the full table for every dataset
+TABLE_QUERIES = {'road_safety': 'safety', 'road_expenditures': 'expenditures'}
+
+
+class SeriesStore:
+    """Country x year matrices of the numeric columns of a dataset, NaN where a country has no data in a year.
+
+    Text columns are kept in attributes, with one value per country and a mask of the years in which it is given. A
+    store is shared by all sessions without copying, so all arrays are read-only.
+    """
+
+    def __init__(self, countries, first_year, values, attributes=None, attribute_masks=None, columns=None):
+        self.countries = list(countries)
+        self.first_year = first_year
+        self.values = values
+        self.attributes = {} if attributes is None else attributes
+        self.masks = {column: ~np.isnan(matrix) for column, matrix in values.items()}
+        self.masks.update({} if attribute_masks is None else attribute_masks)
+
+        # Order of the columns in the long format
+        self.columns = list(values) + list(self.attributes) if columns is None else list(columns)
+
+        shape = next(iter(values.values())).shape if values else (len(self.countries), 0)
+        self.years = np.arange(first_year, first_year + shape[1])
+        self._positions = {country: i for i, country in enumerate(self.countries)}
+
+        for array in [*self.values.values(), *self.attributes.values(), *self.masks.values()]:
+            array.flags.writeable = False
+
+    @classmethod
+    def from_long(cls, df):
+        """Create a store from a dataframe with a row per country and year.
+
+        Text columns must have a single value per country, a ValueError is raised otherwise.
+        """
+        countries = sorted(df['Country'].unique())
+        first_year = int(df['Year'].min())
+        shape = (len(countries), int(df['Year'].max()) - first_year + 1)
+
+        # Position of every row in the matrices
+        rows = pd.Index(countries).get_indexer(df['Country'])
+        columns = df['Year'].to_numpy(dtype=np.int64) - first_year
+
+        values = {}
+        attributes = {}
+        attribute_masks = {}
+        for column in df.columns:
+            if column in ['Year', 'Country']:
+                continue
+
+            if pd.api.types.is_numeric_dtype(df[column]):
+                matrix = np.full(shape, np.nan)
+                matrix[rows, columns] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+                values[column] = matrix
+                continue
+
+            per_country = df.groupby('Country')[column]
+            if (per_country.nunique() > 1).any():
+                raise ValueError(column + ' has more than one value for a country')
+            attributes[column] = per_country.first().reindex(countries).to_numpy(dtype=object)
+
+            mask = np.zeros(shape, dtype=bool)
+            mask[rows, columns] = df[column].notna().to_numpy()
+            attribute_masks[column] = mask
+
+        order = [column for column in df.columns if column not in ['Year', 'Country']]
+        return cls(countries, first_year, values, attributes, attribute_masks, order)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Create a store from a csv file in the long format, like road_safety.csv."""
+        # The default float parser can be off in the last digit, which would change the file when it is written back
+        return cls.from_long(pd.read_csv(path, float_precision='round_trip'))
+
+    def to_long(self, columns=None, dropna=True):
+        """Return the long format with a row per country and year, without rows where all columns are missing."""
+        columns = self.columns if columns is None else columns
+        df = pd.DataFrame({'Year': np.tile(self.years, len(self.countries)),
+                           'Country': np.repeat(self.countries, len(self.years))})
+        for column in columns:
+            if column in self.attributes:
+                values = pd.Series(np.repeat(self.attributes[column], len(self.years)))
+                df[column] = values.where(self.masks[column].ravel())
+            else:
+                df[column] = self.values[column].ravel()
+
+        if dropna:
+            df = df.dropna(subset=columns, how='all').reset_index(drop=True)
+        return df
+
+    def to_csv(self, path, columns=None):
+        """Store the matrices as a csv file in the long format."""
+        self.to_long(columns).to_csv(path, index=False)
+
+    def position(self, country):
+        """Return the row of a country in the matrices."""
+        return self._positions[country]
+
+    def offset(self, year):
+        """Return the column of a year in the matrices."""
+        return int(year) - self.first_year
+
+    def attribute(self, column, country):
+        """Return the value of a text column for a country, e.g. its Location."""
+        return self.attributes[column][self.position(country)]
+
+    def row(self, column, country):
+        """Return the values of a country for all years, a read-only view on the matrix."""
+        return self.values[column][self.position(country)]
+
+    def rows(self, column, countries):
+        """Return the values of several countries for all years, e.g. to overlay them in one chart."""
+        return self.values[column][[self.position(country) for country in countries]]
+
+    def series(self, column, country):
+        """Return the years in which a country has data and its values in those years."""
+        mask = self.masks[column][self.position(country)]
+        return self.years[mask], self.row(column, country)[mask]
+
+    def frame(self, country, columns, required=None):
+        """Return a dataframe with the years and columns of a country, for the years where the required columns
+        all have data."""
+        position = self.position(country)
+        required = [] if required is None else required
+
+        mask = np.ones(len(self.years), dtype=bool)
+        for column in required:
+            mask &= self.masks[column][position]
+
+        df = pd.DataFrame({'Year': self.years[mask]})
+        for column in columns:
+            df[column] = self.values[column][position, mask]
+        return df
+
+
+@st.cache_resource(max_entries=4)
+def load_store(table, version):
+    """Build the store of a dataset from its full table."""
+    return SeriesStore.from_long(query(TABLE_QUERIES[table]))
+
+
+def store(table):
+    """Return the store of a dataset."""
+    return load_store(table, dataset_version(table))
@@ -0,0 +1,112 @@
+import argparse
+import concurrent.futures
+import logging
+import os
+import time
+
+import pandas as pd
+
+# The raw OECD exports in streamlit/data are filtered to the fil_* subsets: the years 1995-2021 and the countries which
+# have data in every source. Instead of handling the sources one after the other, every source is read and parsed in
+# its own worker thread as soon as one is free, and filtering and writing start as soon as all countries are known. The
+# amount of workers is bounded, so a refresh does not open all files at once when more sources are added. The pandas
+# csv parser releases the GIL, so threads parse at the same time without copying the dataframes between processes.
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'streamlit/data'
+
+FIRST_YEAR = 1995
+LAST_YEAR = 2021
+
+# Raw sources with the name of their year column. Sources with a single series get a row for every country and year,
+# also when the year is missing, like the other fil_* files.
+SOURCES = {
+    'gdp_government_spending': {'year': 'Year', 'complete': False},
+    'population': {'year': 'Time', 'complete': True},
+    'road_injuries_deaths': {'year': 'Year', 'complete': True},
+    'road_investment': {'year': 'Year', 'complete': True},
+    'road_maintenance': {'year': 'Year', 'complete': True},
+    'road_passengers': {'year': 'Year', 'complete': True},
+}
+
+# Amount of sources handled at the same time, can be changed with an environment variable
+WORKERS = int(os.environ.get('LOAD_WORKERS', min(len(SOURCES), os.cpu_count() or 1)))
+
+
+def load(name, data_dir=DATA_DIR):
+    """Read and parse a raw source, returns the dataframe, its file size and the read and parse time in ms."""
+    path = os.path.join(data_dir, name + '.csv')
+    size = os.stat(path).st_size
+
+    # The file is parsed while it is read, so it is never held in memory as a whole. The OECD exports start with a
+    # byte order mark.
+    start = time.perf_counter()
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    df = df.rename(columns={SOURCES[name]['year']: 'Year'})
+    df = df[(df['Year'] >= FIRST_YEAR) & (df['Year'] <= LAST_YEAR)]
+    parsed = time.perf_counter()
+
+    return df, {'Size (MB)': size / 1e6, 'Read & parse (ms)': (parsed - start) * 1000, 'Rows': len(df)}
+
+
+def select(df, name, countries, data_dir=DATA_DIR):
+    """Filter a parsed source on the countries and write it as fil_<name>.csv, returns the filter and write time."""
+    start = time.perf_counter()
+    df = df[df['Country'].isin(countries)]
+
+    if SOURCES[name]['complete']:
+        grid = pd.MultiIndex.from_product([range(FIRST_YEAR, LAST_YEAR + 1), sorted(countries)],
+                                          names=['Year', 'Country']).to_frame(index=False)
+        df = grid.merge(df, on=['Year', 'Country'], how='left')
+    else:
+        df = df.sort_values(['Year', 'Country'], kind='stable')
+
+    # Year and country first, followed by the columns of the export
+    df = df[['Year', 'Country'] + [column for column in df.columns if column not in ['Year', 'Country']]]
+    filtered = time.perf_counter()
+
+    df.to_csv(os.path.join(data_dir, 'fil_' + name + '.csv'), index=False)
+    written = time.perf_counter()
+
+    return {'Filter (ms)': (filtered - start) * 1000, 'Write (ms)': (written - filtered) * 1000}
+
+
+def refresh(data_dir=DATA_DIR, workers=WORKERS):
+    """Rebuild all fil_* files from the raw sources, returns the timings per source as a dataframe."""
+    start = time.perf_counter()
+    frames = {}
+    timings = {}
+    countries = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        loads = {pool.submit(load, name, data_dir): name for name in SOURCES}
+
+        # Narrow down the countries while the remaining sources are still being parsed
+        for future in concurrent.futures.as_completed(loads):
+            name = loads[future]
+            frames[name], timings[name] = future.result()
+            found = set(frames[name]['Country'].dropna())
+            countries = found if countries is None else countries & found
+            logger.info('Parsed %s in %.1f ms', name, timings[name]['Read & parse (ms)'])
+
+        selects = {pool.submit(select, frames[name], name, countries, data_dir): name for name in SOURCES}
+        for future in concurrent.futures.as_completed(selects):
+            timings[selects[future]].update(future.result())
+
+    logger.info('Refreshed %d sources for %d countries in %.1f ms', len(SOURCES), len(countries),
+                (time.perf_counter() - start) * 1000)
+
+    return pd.DataFrame.from_dict(timings, orient='index').loc[list(SOURCES)].round(2)
+
+
+# To refresh the filtered data, run in a terminal: python streamlit/dashboard/sources.py [--workers 4]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Filter the raw OECD sources to the fil_* files.')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='amount of sources handled at the same time')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    start = time.perf_counter()
+    print(refresh(workers=args.workers))
+    print('Total: %.1f ms' % ((time.perf_counter() - start) * 1000))
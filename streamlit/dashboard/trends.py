@@ -0,0 +1,124 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import streamlit as st
+
+from dashboard.query import dataset_version
+from dashboard.series import store
+
+# Trends and short-term forecasts of the per country series. All countries are fitted at once on a dense
+# country x year matrix, where missing years are NaN, so the cost does not grow with a fit per country and selection.
+
+METHODS = ['Linear', 'Theil-Sen']
+
+
+def _matrix(table, column):
+    """Return the countries, years and the country x year matrix of a column."""
+    series = store(table)
+    return series.countries, series.years.astype(np.float64), series.values[column]
+
+
+def fit_linear(years, matrix):
+    """Least squares slope and intercept of every row, ignoring missing years."""
+    mask = ~np.isnan(matrix)
+    counts = mask.sum(axis=1)
+    x = np.where(mask, years, 0)
+    y = np.where(mask, matrix, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = x.sum(axis=1) / counts
+        y_mean = y.sum(axis=1) / counts
+        dx = np.where(mask, years - x_mean[:, np.newaxis], 0)
+        dy = np.where(mask, matrix - y_mean[:, np.newaxis], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+    # At least two years are needed to fit a line
+    slope[counts < 2] = np.nan
+    return slope, y_mean - slope * x_mean
+
+
+def fit_theil_sen(years, matrix):
+    """Theil-Sen slope and intercept of every row: the median of the slopes between all pairs of years."""
+    first, second = np.triu_indices(len(years), k=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (matrix[:, second] - matrix[:, first]) / (years[second] - years[first])
+
+    # Rows with less than two years only have NaN slopes, which is also the outcome we want
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        slope = np.nanmedian(slopes, axis=1)
+        intercept = np.nanmedian(matrix - slope[:, np.newaxis] * years, axis=1)
+    return slope, intercept
+
+
+def smooth(matrix, alpha):
+    """Simple exponential smoothing of every row, the level after the last year is the forecast."""
+    level = np.full(matrix.shape[0], np.nan)
+    for values in matrix.T:
+        # Years without data leave the level as it is, the first year with data starts it
+        smoothed = np.where(np.isnan(level), values, alpha * values + (1 - alpha) * level)
+        level = np.where(np.isnan(values), level, smoothed)
+    return level
+
+
+@st.cache_data(max_entries=16)
+def fit_trends(table, column, method, version):
+    """Fit the trend of a column for all countries, returns slope and intercept per country."""
+    countries, years, matrix = _matrix(table, column)
+    fit = fit_linear if method == 'Linear' else fit_theil_sen
+    slope, intercept = fit(years, matrix)
+    return pd.DataFrame({'Slope': slope, 'Intercept': intercept}, index=countries)
+
+
+@st.cache_data(max_entries=16)
+def forecast_levels(table, column, alpha, version):
+    """Exponentially smoothed level of a column after the last year with data, per country."""
+    countries, years, matrix = _matrix(table, column)
+    return pd.Series(smooth(matrix, alpha), index=countries)
+
+
+def trend(table, column, country, method, years):
+    """Return the trend of a country for the given years."""
+    fits = fit_trends(table, column, method, dataset_version(table))
+    slope, intercept = fits.loc[country]
+    years = np.asarray(years, dtype=np.float64)
+    return slope * years + intercept
+
+
+def forecast(table, column, country, last_year, horizon=3, alpha=0.5):
+    """Return the years after the last year and the forecast of a country for those years."""
+    level = forecast_levels(table, column, alpha, dataset_version(table))[country]
+    years = np.arange(last_year + 1, last_year + 1 + horizon)
+    return years, np.full(horizon, level)
+
+
+def add_trend(fig, table, column, country, method, years, value_format, name=''):
+    """Overlay the trend and the forecast of a country on a figure with years on the x-axis."""
+    if len(years) < 2:
+        return fig
+
+    years = np.sort(np.asarray(years))
+    label = name + ' ' if name else ''
+
+    fig.add_trace(go.Scatter(x=years,
+                             y=trend(table, column, country, method, years),
+                             mode='lines',
+                             line=dict(dash='dot'),
+                             name=label + method.lower() + ' trend',
+                             hovertemplate='<b>Year:</b> %{x}<br><b>' + method + ' trend:</b> %{y:' + value_format
+                                           + '}<extra></extra>'
+                             ))
+
+    future, values = forecast(table, column, country, years[-1])
+    fig.add_trace(go.Scatter(x=future,
+                             y=values,
+                             mode='lines+markers',
+                             line=dict(dash='dash'),
+                             name=label + 'forecast',
+                             hovertemplate='<b>Year:</b> %{x}<br><b>Forecast:</b> %{y:' + value_format
+                                           + '}<extra></extra>'
+                             ))
+
+    return fig
@@ -4,6 +4,13 @@ import plotly.express as px
 import numpy as np
 import plotly.graph_objs as go
 
+from dashboard.comparison import pairwise, relative_difference
+from dashboard.metrics import hover
+from dashboard.payload import PayloadBudget
+from dashboard.query import available, query
+from dashboard.series import store
+from dashboard.trends import METHODS, add_trend
+
 # Set page name
 st.set_page_config(
     page_title='Road Safety',
@@ -11,6 +18,9 @@ st.set_page_config(
     layout='wide'
 )
 
+# Slims and measures the charts sent to the browser during this rerun
+budget = PayloadBudget('Road Safety')
+
 st.markdown("<h1 style='text-align: center; color: white;'>Road injuries & casualties</h1>", unsafe_allow_html=True)
 
 st.markdown("<p style='text-align: center; color: white;'>"
@@ -20,22 +30,18 @@ st.markdown("<p style='text-align: center; color: white;'>"
             "and compared to other countries relative to their populations."
             "<br>On the sidebar, a country and year can be chosen to investigate.</p>", unsafe_allow_html=True)
 
-# Read in road safety file
-df = pd.read_csv('streamlit/data/app_data/road_safety.csv')
-
 # Create country and year selections
-country = st.sidebar.selectbox('Select country:', df['Country'].unique())
-year = st.sidebar.select_slider('Select year:', df['Year'].unique())
-
-# Create dataframes based upon year or country
-df_country = df[df['Country'] == country].copy()
-df_others = df[df['Country'] != country].copy()
-df_year = df_others.query('Year==' + str(year)).copy()
-df_country_year = df_country.query('Year==' + str(year)).copy()
-
-# Remove entries with no injury data
-df_country.dropna(subset=['Injuries'], inplace=True)
-df_year.dropna(subset=['Injuries'], inplace=True)
+country = st.sidebar.selectbox('Select country:', query('safety_countries')['Country'])
+year = st.sidebar.select_slider('Select year:', query('safety_years')['Year'])
+method = st.sidebar.selectbox('Select trend:', METHODS)
+
+# Get dataframes based upon year or country, entries with no injury data are left out of the country and other
+# countries dataframes
+df_country = store('road_safety').frame(country,
+                                        ['Population', 'Injuries', 'Injuries_passenger_kilometres'],
+                                        required=['Injuries'])
+df_year = query('safety_others_year', country=country, year=year)
+df_country_year = query('safety_country_year', country=country, year=year)
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Create streamlit page columns
@@ -57,7 +63,10 @@ with col1:
                            hovertemplate='<b>Year:</b> %{x}<br><b>Population:</b> %{customdata:,.0f}<br><b>'
                                          'Injuries & Deaths:</b> %{y}')
 
-    st.plotly_chart(fig_line, use_container_width=True)
+    # Add the trend and forecast of the country
+    add_trend(fig_line, 'road_safety', 'Injuries', country, method, df_country['Year'], ',.0f')
+
+    budget.plotly_chart(fig_line, use_container_width=True)
 
 with col2:
     st.header('Compared to other countries')
@@ -66,9 +75,9 @@ with col2:
                 "by showing the percentage differences in road injuries and deaths relative to the populations "
                 "for a particular year.</p>", unsafe_allow_html=True)
 
-    # Calculate percentage change
-    df_year['Percentage_change'] = ((df_year['Percentage_inj_pop']
-                                     / df_country_year['Percentage_inj_pop'].values[0]) - 1)*100
+    # Get percentage change from the precomputed comparison of all countries
+    df_year['Percentage_change'] = df_year['Country'].map(relative_difference('Percentage_change_inj_pop',
+                                                                              country, year))
 
     # Create histogram for all countries of an entered year
     fig_hist = px.histogram(df_year, x='Country', y='Percentage_change')
@@ -84,27 +93,29 @@ with col2:
                            hovertemplate='<b>Country:</b> %{x}<br><b>Year:</b> %{customdata[0]}<br>'
                                          '<b>Population:</b> %{customdata[1]:,.0f}<br>'
                                          '<b>Road injuries & deaths:</b> %{customdata[2]:,.0f}<br>'
-                                         '<b>Percentage change:</b> %{y:,.1f}%<extra></extra>'
+                                         '<b>Percentage change:</b> ' + hover('Percentage_change_inj_pop', 'y')
+                                         + '%<extra></extra>'
                            )
 
     # If the chosen country has no injury data, cannot compare it to other countries
     if pd.isnull(df_country_year['Injuries'].iloc[0]):
         st.write('No data available for ' + country + ' in ' + str(year))
     else:
-        st.plotly_chart(fig_hist, use_container_width=True)
+        budget.plotly_chart(fig_hist, use_container_width=True)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Get dataframes for the selected year and the year before
-df_this_year = df.query('Year==' + str(year)).copy()
-df_last_year = df.query('Year==' + str(year-1)).copy()
+# Get the relative best and worst countries of every year
+df_perc = query('safety_extremes_pop')
+df_this_year = df_perc[df_perc['Year'] == year]
+df_last_year = df_perc[df_perc['Year'] == year - 1]
 
 # Set best and worst percentage changes and countries
-safest_val = df_this_year['Percentage_inj_pop'].min()
-worst_val = df_this_year['Percentage_inj_pop'].max()
-safest_val_last_year = df_last_year['Percentage_inj_pop'].min()
-worst_val_last_year = df_last_year['Percentage_inj_pop'].max()
-safest_countries = df_this_year[df_this_year['Percentage_inj_pop'] == safest_val]['Country']
-worst_countries = df_this_year[df_this_year['Percentage_inj_pop'] == worst_val]['Country']
+safest_val = df_this_year['rel_b'].min()
+worst_val = df_this_year['rel_w'].max()
+safest_val_last_year = df_last_year['rel_b'].min()
+worst_val_last_year = df_last_year['rel_w'].max()
+safest_countries = df_this_year['country_best']
+worst_countries = df_this_year['country_worst']
 
 st.markdown("""<p style='text-align: center; color: white;'>Below, we show the two countries with the lowest and 
 highest percentage of the countries population that is injured or dies in road accidents, and the difference between 
@@ -145,34 +156,6 @@ with col3:
 st.markdown("""<p style='text-align: center; color: white;'>To get an idea about the trend of road injuries & deaths, 
 we plot the best and worst countries of each year against each other.</p>""", unsafe_allow_html=True)
 
-years = []
-rel_best = []
-country_best = []
-rel_worst = []
-country_worst = []
-
-# Create columns so relative best and worst countries can be put in a graph
-for yr in df['Year'].unique():
-    years.append(yr)
-    df_y = df[df['Year'] == yr]
-
-    df_b = df_y[df_y['Percentage_inj_pop'] == df_y['Percentage_inj_pop'].min()]
-    df_w = df_y[df_y['Percentage_inj_pop'] == df_y['Percentage_inj_pop'].max()]
-
-    rel_best.append(df_b['Percentage_inj_pop'].iloc[0])
-    country_best.append(df_b['Country'].iloc[0])
-
-    rel_worst.append(df_w['Percentage_inj_pop'].iloc[0])
-    country_worst.append(df_w['Country'].iloc[0])
-
-# New dataframe with relative best and worst countries
-df_perc = pd.DataFrame(data={'Year': years,
-                             'rel_b': rel_best,
-                             'country_best': country_best,
-                             'rel_w': rel_worst,
-                             'country_worst': country_worst
-                             })
-
 # Create a line graph of relative best and worst countries
 fig_line = px.line(df_perc,
                    x='Year',
@@ -196,7 +179,7 @@ fig_line.data[0].hovertemplate = ('<b>Country:</b> %{customdata[0]}<br><b>Year:<
 fig_line.data[1].hovertemplate = ('<b>Country:</b> %{customdata[1]}<br><b>Year:</b> %{x}<br><b>Percentage of '
                                   'population:</b> %{y:.2f}%<extra></extra>')
 
-st.plotly_chart(fig_line, use_container_width=True)
+budget.plotly_chart(fig_line, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>When looking at the above plot, overall the percentage 
 of road injuries & deaths for the best countries seems to stay equal while the worst countries perform better over the 
@@ -216,11 +199,8 @@ injuries & deaths, and see if we have a linear increasing trend.</p>""", unsafe_
 
 st.header('Passenger kilometres')
 
-# Creating scatter plot dataframe using chosen year
-df_sc = df.query('Year==' + str(year)).copy()
-
-# Drop entries with no rows or passenger kilometres
-df_sc.dropna(subset=['Injuries', 'Passenger_kilometres'], inplace=True)
+# Creating scatter plot dataframe using chosen year, without entries with no injuries or passenger kilometres
+df_sc = query('safety_year_passenger_kilometres', year=year)
 
 # Plot passenger kilometres against injuries in a scatter plot
 fig_scatter_pk = px.scatter(df_sc,
@@ -285,7 +265,7 @@ fig_comb.update_layout(title='Road injuries and deaths relative to passenger km
                        yaxis_title='Road injuries and deaths'
                        )
 
-st.plotly_chart(fig_comb, use_container_width=True)
+budget.plotly_chart(fig_comb, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>Unsurprisingly, the scatter plot above shows a correlation
 between km driven and road injuries & deaths. Therefore, we should take into account the total amount of passenger 
@@ -316,7 +296,11 @@ with col1:
                            hovertemplate='<b>Year:</b> %{x}<br><b>Population:</b> %{customdata:,.0f}<br>'
                                          '<b>Injuries & deaths per 1B passenger km:</b> %{y:.1f}')
 
-    st.plotly_chart(fig_line, use_container_width=True)
+    # Add the trend and forecast of the country
+    add_trend(fig_line, 'road_safety', 'Injuries_passenger_kilometres', country, method,
+              df_country.dropna(subset=['Injuries_passenger_kilometres'])['Year'], ',.1f')
+
+    budget.plotly_chart(fig_line, use_container_width=True)
 
 with col2:
     st.header('And compared to other countries')
@@ -328,9 +312,9 @@ with col2:
     # Drop entries with no passenger kilometres
     df_year.dropna(subset=['Passenger_kilometres'], inplace=True)
 
-    # Calculate percentage change
-    df_year['Percentage_change'] = ((df_year['Percentage_inj_pk_pop']
-                                     / df_country_year['Percentage_inj_pk_pop'].values[0]) - 1) * 100
+    # Get percentage change from the precomputed comparison of all countries
+    df_year['Percentage_change'] = df_year['Country'].map(relative_difference('Percentage_change_inj_pk_pop',
+                                                                              country, year))
 
     # Create histogram for specified year
     fig_hist = px.histogram(df_year, x='Country', y='Percentage_change')
@@ -349,13 +333,14 @@ with col2:
                                          '<b>Population:</b> %{customdata[1]:,.0f}<br>'
                                          '<b>Passenger km in millions:</b> %{customdata[2]:,.0f}<br>'
                                          '<b>Road injuries & deaths per 1B passenger km:</b> %{customdata[3]:,.1f}<br>'
-                                         '<b>Percentage change:</b> %{y:,.1f}%<extra></extra>')
+                                         '<b>Percentage change:</b> ' + hover('Percentage_change_inj_pk_pop', 'y')
+                                         + '%<extra></extra>')
 
     # If chosen country does not have a passenger kilometres value, we cannot compare it to other countries
     if pd.isnull(df_country_year['Passenger_kilometres'].iloc[0]):
         st.write('No data available for ' + country + ' in ' + str(year))
     else:
-        st.plotly_chart(fig_hist, use_container_width=True)
+        budget.plotly_chart(fig_hist, use_container_width=True)
 
 # ----------------------------------------------------------------------------------------------------------------------
 
@@ -363,33 +348,8 @@ st.markdown("""<p style='text-align: center; color: white;'>As before, we plot t
 each year against each other. In this case, we look at the amount of road injuries & deaths per 1B passenger kilometres
 relative to the countries' populations.</p>""", unsafe_allow_html=True)
 
-years = []
-rel_best = []
-country_best = []
-rel_worst = []
-country_worst = []
-
-# Get best and worst values and countries
-for yr in df['Year'].unique():
-    years.append(yr)
-    df_y = df[df['Year'] == yr]
-
-    df_b = df_y[df_y['Percentage_inj_pk_pop'] == df_y['Percentage_inj_pk_pop'].min()]
-    df_w = df_y[df_y['Percentage_inj_pk_pop'] == df_y['Percentage_inj_pk_pop'].max()]
-
-    rel_best.append(df_b['Percentage_inj_pk_pop'].iloc[0])
-    country_best.append(df_b['Country'].iloc[0])
-
-    rel_worst.append(df_w['Percentage_inj_pk_pop'].iloc[0])
-    country_worst.append(df_w['Country'].iloc[0])
-
-# Create dataframe of best and worst values and countries
-df_perc_pk = pd.DataFrame(data={'Year': years,
-                                'rel_b': rel_best,
-                                'country_best': country_best,
-                                'rel_w': rel_worst,
-                                'country_worst': country_worst
-                                })
+# Get dataframe of best and worst values and countries
+df_perc_pk = query('safety_extremes_pk_pop')
 
 # Plot the line graph of best and worst countries
 fig_line = px.line(df_perc_pk,
@@ -415,7 +375,7 @@ fig_line.data[0].hovertemplate = ('<b>Country:</b> %{customdata[0]}<br><b>Year:<
 fig_line.data[1].hovertemplate = ('<b>Country:</b> %{customdata[1]}<br><b>Year:</b> %{x}<br><b>Percentage of '
                                   'population:</b> %{y:.3f}%<extra></extra>')
 
-st.plotly_chart(fig_line, use_container_width=True)
+budget.plotly_chart(fig_line, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>Iceland is overall the country with the highest percentage
 of road injuries and deaths relative to passenger kilometres and the population. One explanation could be that due to
@@ -427,3 +387,62 @@ The United States went from having the most road injuries & deaths relative to t
 fewest when taking passenger kilometres into account. It is well-known that the USA has a big car culture, and with the
 distances people have to cover each day, it explains that when taking distance travelled into account the USA seems
 safer.</p>""", unsafe_allow_html=True)
+
+# ----------------------------------------------------------------------------------------------------------------------
+st.header('Pairwise comparison')
+
+st.markdown("""<p style='text-align: center; color: white;'>Finally, every country can be compared to every other
+country at once. Each row shows the percentage differences of the other countries compared to the country of that row
+for the chosen year.</p>""", unsafe_allow_html=True)
+
+# Create comparison selection
+comparisons = {'Relative to the populations': 'Percentage_change_inj_pop',
+               'Per 1B passenger km relative to the populations': 'Percentage_change_inj_pk_pop'}
+comparison = st.radio('Compare road injuries & deaths:', list(comparisons), horizontal=True)
+
+# Get the comparison of all countries with each other for the chosen year
+df_pairs = pairwise(comparisons[comparison], year)
+
+# Plot heatmap of the comparison, differences over 100% get the same colour
+fig_heat = px.imshow(df_pairs,
+                     color_continuous_scale='RdBu_r',
+                     range_color=(-100, 100),
+                     aspect='auto'
+                     )
+
+fig_heat.update_layout(title='Percentage change in ' + str(year) + ' between all countries',
+                       xaxis_title='Country',
+                       yaxis_title='Compared to',
+                       coloraxis_colorbar_title='',
+                       height=700
+                       )
+
+fig_heat.update_traces(hovertemplate='<b>Country:</b> %{x}<br><b>Compared to:</b> %{y}<br>'
+                                     '<b>Percentage change:</b> ' + hover(comparisons[comparison], 'z')
+                                     + '%<extra></extra>')
+
+budget.plotly_chart(fig_heat, use_container_width=True)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Drill down into regions and months, only possible when crash-level microdata has been ingested
+df_region = query('crashes_region_month', country=country, year=year) if available('crashes_region_month') else None
+
+if df_region is not None and not df_region.empty:
+    st.header('Per region')
+
+    st.markdown("""<p style='text-align: center; color: white;'>Here, the road injuries and deaths of the chosen country
+    and year are split into regions and months.</p>""", unsafe_allow_html=True)
+
+    # Create stacked bar chart of the injuries per month and region
+    fig_region = px.bar(df_region, x='Month', y='Injuries', color='Region')
+
+    fig_region.update_layout(title='Road injuries & deaths per region in ' + country + ' in ' + str(year),
+                             yaxis_title='Injuries and deaths'
+                             )
+
+    fig_region.update_traces(hovertemplate='<b>Region:</b> %{fullData.name}<br><b>Month:</b> %{x}<br>'
+                                           '<b>Injuries & deaths:</b> %{y:,.0f}<extra></extra>')
+
+    budget.plotly_chart(fig_region, use_container_width=True)
+
+budget.report()
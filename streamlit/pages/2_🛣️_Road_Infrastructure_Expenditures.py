@@ -1,7 +1,11 @@
-import pandas as pd
 import streamlit as st
 import plotly.express as px
 
+from dashboard.payload import PayloadBudget
+from dashboard.query import query
+from dashboard.series import store
+from dashboard.trends import METHODS, add_trend
+
 # Set page name
 st.set_page_config(
     page_title='Road Expenditures',
@@ -9,6 +13,9 @@ st.set_page_config(
     layout='wide'
 )
 
+# Slims and measures the charts sent to the browser during this rerun
+budget = PayloadBudget('Road Expenditures')
+
 st.markdown("<h1 style='text-align: center; color: white;'>Road infrastructure expenditures</h1>",
             unsafe_allow_html=True)
 
@@ -17,18 +24,14 @@ for different countries relative to the total government expenditures.<br>On the
 chosen to investigate and compare countries, or a country can be chosen to investigate and see how the expenditures
 change over the years.</p>""", unsafe_allow_html=True)
 
-# Read in road expenditures file
-df = pd.read_csv('streamlit/data/app_data/road_expenditures.csv')
-
 # Create year and country selections
-year = st.sidebar.select_slider('Select year:', df['Year'].unique())
-country = st.sidebar.selectbox('Select country:', df['Country'].unique())
+year = st.sidebar.select_slider('Select year:', query('expenditures_years')['Year'])
+country = st.sidebar.selectbox('Select country:', query('expenditures_countries')['Country'])
+method = st.sidebar.selectbox('Select trend:', METHODS)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create dataframe based upon chosen year
-df_year = df[df['Year'] == year].copy()
-# Drop entries with no maintenance and investments percentages
-df_year.dropna(subset=['Perc_Maintenance', 'Perc_Investments'], inplace=True)
+# Get dataframe based upon chosen year, without entries with no maintenance and investments percentages
+df_year = query('expenditures_year_percentages', year=year)
 
 # Plot bar chart of countries maintenance and investments percentages for a specified year
 fig_bar = px.bar(df_year,
@@ -51,13 +54,13 @@ fig_bar.data[0].hovertemplate = ('<b>Country:</b> %{x}<br><b>Year:</b> ' + str(y
 fig_bar.data[1].hovertemplate = ('<b>Country:</b> %{x}<br><b>Year:</b> ' + str(year)
                                  + '<br><b>Percentage spend on investments:</b> %{y:.1f}%<extra></extra>')
 
-st.plotly_chart(fig_bar, use_container_width=True)
+budget.plotly_chart(fig_bar, use_container_width=True)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# Create dataframe based upon chosen country
-df_country = df[df['Country'] == country].copy()
-# Drop entries with no maintenance and investments percentages
-df_country.dropna(subset=['Perc_Maintenance', 'Perc_Investments'], inplace=True)
+# Get dataframe based upon chosen country, without entries with no maintenance and investments percentages
+df_country = store('road_expenditures').frame(country,
+                                              ['Perc_Maintenance', 'Perc_Investments'],
+                                              required=['Perc_Maintenance', 'Perc_Investments'])
 
 # Plot the bar
 fig_bar = px.bar(df_country,
@@ -82,7 +85,14 @@ fig_bar.data[1].hovertemplate = ('<b>Country:</b> ' + country
                                  + '<br><b>Year:</b> %{x}<br>'
                                    '<b>Percentage spend on investments:</b> %{y:.1f}%<extra></extra>')
 
-st.plotly_chart(fig_bar, use_container_width=True)
+# Add the trends and forecasts of the country. The bars are stacked, so the top of the investments bars is the total
+# percentage and that is the series shown for the upper segment
+add_trend(fig_bar, 'road_expenditures', 'Perc_Maintenance', country, method, df_country['Year'], '.1f',
+          name='Maintenance')
+add_trend(fig_bar, 'road_expenditures', 'Perc_Cost_Sum', country, method, df_country['Year'], '.1f',
+          name='Total')
+
+budget.plotly_chart(fig_bar, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>Most countries are below 5% total road costs for the period
 1995-2021. Croatia, however, spends more and more to over 60% in 2003 after which it decreases
@@ -98,3 +108,5 @@ Italy, and New Zealand for which this doesn't hold. In the case of Canada, this
 For Italy and New Zealand, it seems to be more common. A reason for Italy could be the use of the established roads by 
 the Roman Empire and thus requiring a lot of maintenance. For New Zealand, the fact that it is an island limits to a 
 degree the amount of roads that can be build.</p>""", unsafe_allow_html=True)
+
+budget.report()
@@ -1,7 +1,10 @@
-import pandas as pd
 import streamlit as st
 import plotly.express as px
 
+from dashboard.metrics import hover
+from dashboard.payload import PayloadBudget
+from dashboard.query import query
+
 # Set page name
 st.set_page_config(
     page_title='Correlation Research',
@@ -9,6 +12,9 @@ st.set_page_config(
     layout='wide'
 )
 
+# Slims and measures the charts sent to the browser during this rerun
+budget = PayloadBudget('Correlation Research')
+
 st.markdown("<h1 style='text-align: center; color: white;'>Relation road safety & expenditures</h1>",
             unsafe_allow_html=True)
 
@@ -16,25 +22,8 @@ st.markdown("""<p style='text-align: center; color: white;'>Here we analyse the
 road expenditures.<br> Our hypothesis is that higher road expenditures increase the road safety.</p>""",
             unsafe_allow_html=True)
 
-# Read in road safety and expenditures files
-df_safety = pd.read_csv('streamlit/data/app_data/road_safety.csv')
-df_expend = pd.read_csv('streamlit/data/app_data/road_expenditures.csv')
-
-# Concatenate required columns
-df = pd.concat([df_safety['Year'],
-                df_safety['Country'],
-                df_safety['Population'],
-                df_safety['Injuries_passenger_kilometres'],
-                df_safety['Percentage_inj_pk_pop'],
-                df_expend['Perc_Maintenance'],
-                df_expend['Perc_Investments'],
-                df_expend['Maintenance'],
-                df_expend['Investments']
-                ], axis=1)
-
-# Sum total percentages road expenditures
-df['Perc_Cost_Sum'] = df['Perc_Maintenance'] + df['Perc_Investments']
-df['Cost_Sum'] = df['Maintenance'] + df['Investments']
+# Join the required road safety and expenditures columns
+df = query('relation')
 
 st.markdown("""<p style='text-align: center; color: white;'>As our data only contains expenditures in local currencies,
 we cannot simply compare countries to one another. Therefore, we first look if there is a correlation between road
@@ -45,8 +34,8 @@ expenditures versus its injury & death ratio per 1B passenger kilometres over th
 # Create country selection
 country = st.sidebar.selectbox('Select country:', df['Country'].unique())
 
-# Create dataframe for the selected country
-df_country = df[df['Country'] == country]
+# Get dataframe for the selected country
+df_country = query('relation_country', country=country)
 
 # Scatter plot between costs and injuries per passenger kilometre
 fig_sr = px.scatter(df_country,
@@ -64,14 +53,14 @@ fig_sr.update_layout(title='Correlation road expenditures and injuries/deaths fo
 
 fig_sr.update_traces(hovertemplate='<b>Country:</b> %{customdata[0]}<br>'
                                    '<b>Year:</b> %{customdata[1]}<br>'
-                                   '<b>Road expenditures:</b> %{x:,.0f}<br>'
+                                   '<b>Road expenditures:</b> ' + hover('Cost_Sum', 'x') + '<br>'
                                    '<b>Injuries/deaths per 1B passenger km:</b> %{y:,.0f}'
                                    '<extra></extra>')
 
 # Setting x-axis to logarithmic scale
 fig_sr.update_xaxes(type='log')
 
-st.plotly_chart(fig_sr, use_container_width=True)
+budget.plotly_chart(fig_sr, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>Overall, there seems to be a correlation between road
 expenditures and safety. However, some notable countries for which this is not true are: Japan, Türkiye and New Zealand.
@@ -111,14 +100,14 @@ fig_sc.update_layout(title='Correlation road expenditures and injuries/deaths',
 fig_sc.update_traces(hovertemplate='<b>Country:</b> %{customdata[0]}<br>'
                                    '<b>Year:</b> %{customdata[1]}<br>'
                                    '<b>Population:</b> %{customdata[2]:,.0f}<br>'
-                                   '<b>Percentage road expenditures:</b> %{x:,.1f}<br>'
+                                   '<b>Percentage road expenditures:</b> ' + hover('Perc_Cost_Sum', 'x') + '<br>'
                                    '<b>Percentage injury/death:</b> %{y:,.5f}<br>'
                                    '<extra></extra>')
 
 fig_sc.update_xaxes(type='log')
 fig_sc.update_yaxes(type='log')
 
-st.plotly_chart(fig_sc, use_container_width=True)
+budget.plotly_chart(fig_sc, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>As we saw in Road Infrastructure Expenditures, the 
 majority of the countries spend between 1% and 10% of their total expenditures on road infrastructure. However,
@@ -129,6 +118,46 @@ still has more relative injuries & deaths compared to Belgium who spends the lea
 
 # ----------------------------------------------------------------------------------------------------------------------
 
+# Expenditures converted to constant-price, PPP-adjusted US dollars, only available after dashboard.currency has run
+df_usd = df.dropna(subset=['Cost_Sum_USD_per_capita', 'Injuries_passenger_kilometres'])
+
+if df_usd.empty:
+    st.info('Road expenditures in constant-price, PPP-adjusted US dollars are not available. Add the OECD PPP and '
+            'deflator tables to streamlit/data and run python streamlit/dashboard/currency.py to compare absolute '
+            'road expenditures between countries.')
+else:
+    st.markdown("""<p style='text-align: center; color: white;'>By converting the road expenditures to US dollars with
+    the purchasing power parities and the prices of a single year, we can also compare the absolute road expenditures
+    between countries. Below, we plot the road expenditures per inhabitant against the injuries & deaths per 1B
+    passenger kilometres.</p>""", unsafe_allow_html=True)
+
+    # Scatter plot between absolute costs per inhabitant and injuries per passenger kilometre for all countries
+    fig_usd = px.scatter(df_usd,
+                         x='Cost_Sum_USD_per_capita',
+                         y='Injuries_passenger_kilometres',
+                         color='Country',
+                         color_discrete_sequence=px.colors.qualitative.Alphabet,
+                         hover_data=['Country', 'Year', 'Cost_Sum_USD_per_pkm']
+                         )
+
+    fig_usd.update_layout(title='Correlation absolute road expenditures and injuries/deaths',
+                          xaxis_title='Road expenditures per inhabitant (constant PPP US dollars)',
+                          yaxis_title='Injuries/deaths per 1B passenger km'
+                          )
+
+    fig_usd.update_traces(hovertemplate='<b>Country:</b> %{customdata[0]}<br>'
+                                        '<b>Year:</b> %{customdata[1]}<br>'
+                                        '<b>Road expenditures per inhabitant:</b> $%{x:,.2f}<br>'
+                                        '<b>Road expenditures per passenger km:</b> $%{customdata[2]:,.4f}<br>'
+                                        '<b>Injuries/deaths per 1B passenger km:</b> %{y:,.0f}'
+                                        '<extra></extra>')
+
+    fig_usd.update_xaxes(type='log')
+
+    budget.plotly_chart(fig_usd, use_container_width=True)
+
+# ----------------------------------------------------------------------------------------------------------------------
+
 st.markdown("""<p style='text-align: center; color: white;'>Below, individual countries can be picked. Here, we compare
 the correlations of percentage of total expenditures to total road expenditures, where the correlation of total road 
 expenditures is the same as the one plotted at the top of this page.</p>""", unsafe_allow_html=True)
@@ -155,17 +184,18 @@ with col1:
 
     fig_sc.update_traces(hovertemplate='<b>Country:</b> %{customdata[0]}<br>'
                                        '<b>Year:</b> %{customdata[1]}<br>'
-                                       '<b>Percentage road expenditures:</b> %{x:,.1f}<br>'
+                                       '<b>Percentage road expenditures:</b> ' + hover('Perc_Cost_Sum', 'x')
+                                       + '<br>'
                                        '<b>Injuries/deaths per 1B passenger km:</b> %{y:,.0f}'
                                        '<extra></extra>')
 
-    st.plotly_chart(fig_sc, use_container_width=True)
+    budget.plotly_chart(fig_sc, use_container_width=True)
 
 with col2:
     st.header('Total road expenditures')
 
     # Replot same scatter plot as the first one in this file
-    st.plotly_chart(fig_sr, use_container_width=True)
+    budget.plotly_chart(fig_sr, use_container_width=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>The comparisons above show that spending more money
 on road infrastructure does not always equal spending more of your total expenditures. A good example here is the United
@@ -180,3 +210,5 @@ We can theorize about a possible causation here. For example, cars have gotten s
 automatic break systems and other tools to help the driver. Another cause could be lessons learned from dangerous
 driving situations. Think about intersections being adjusted after several accidents or separation of motor vehicles and
 bikes/scooters.</p>""", unsafe_allow_html=True)
+
+budget.report()
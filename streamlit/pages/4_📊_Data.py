@@ -1,6 +1,8 @@
 import pandas as pd
 import streamlit as st
 
+from dashboard.query import QUERY_LOG, query, stored_columns
+
 # Set page name
 st.set_page_config(
     page_title='Data',
@@ -13,16 +15,16 @@ st.markdown("<h1 style='text-align: center; color: white;'>Data</h1>", unsafe_al
 st.markdown("""<p style='text-align: center; color: white;'>Here, you can look through the data used in this mini
 project.</p>""", unsafe_allow_html=True)
 
-# Read in safety and expenditures dataframes
-df_saf = pd.read_csv('streamlit/data/app_data/road_safety.csv')
-df_exp = pd.read_csv('streamlit/data/app_data/road_expenditures.csv')
-
 # Create data selection
-data = st.sidebar.selectbox('Select dataset:', ['Road Safety', 'Road Expenditures'])
+data = st.sidebar.selectbox('Select dataset:', ['Road Safety', 'Road Expenditures', 'Query Log'])
 
-# Show chosen dataframe
+# Show chosen dataframe as stored, without the columns which are added when it is loaded
 if data == 'Road Safety':
-    st.dataframe(df_saf)
+    st.dataframe(query('safety')[stored_columns('road_safety')])
 
 if data == 'Road Expenditures':
-    st.dataframe(df_exp)
+    st.dataframe(query('expenditures')[stored_columns('road_expenditures')])
+
+# Show the timings of the most recent queries of the pages
+if data == 'Query Log':
+    st.dataframe(pd.DataFrame(list(QUERY_LOG)))
@@ -1,6 +1,9 @@
 import streamlit as st
 import plotly.express as px
-import pandas as pd
+
+from dashboard.metrics import hover
+from dashboard.payload import PayloadBudget
+from dashboard.query import query
 
 # Set page name
 st.set_page_config(
@@ -9,6 +12,9 @@ st.set_page_config(
     layout='wide'
 )
 
+# Slims and measures the charts sent to the browser during this rerun
+budget = PayloadBudget('Home')
+
 st.markdown("<h1 style='text-align: center; color: white;'>Home Page</h1>", unsafe_allow_html=True)
 
 st.markdown("""<p style='text-align: center; color: white;'>This mini project tries to answer the following question:
@@ -24,23 +30,16 @@ plots to see if there is a correlation.</p>""", unsafe_allow_html=True)
 st.markdown("""<p style='text-align: center; color: white;'>Below, you can play around with the data which will be 
 analyzed on the subsequent pages. Pick a year to visualize the data on the globes.</p>""", unsafe_allow_html=True)
 
-# Read in dataframes
-df_saf = pd.read_csv('streamlit/data/app_data/road_safety.csv')
-df_exp = pd.read_csv('streamlit/data/app_data/road_expenditures.csv')
-
 # Create year selection
-year = st.select_slider('Select year:', df_saf['Year'].unique())
+year = st.select_slider('Select year:', query('safety_years')['Year'])
 
-# Set total road expenditures percentage
-df_exp['Total_Perc'] = df_exp['Perc_Maintenance'] + df_exp['Perc_Investments']
-
-# Set chosen year in data
-df_saf_year = df_saf[df_saf['Year'] == year]
-df_exp_year = df_exp[df_exp['Year'] == year]
+# Get data of the chosen year
+df_saf_year = query('safety_year', year=year)
+df_exp_year = query('expenditures_year', year=year)
 
 # Get max amount of injuries and percentage expenditures for a chosen year
 max_injuries = df_saf_year['Injuries_passenger_kilometres'].max()
-max_expenditures = df_exp_year['Total_Perc'].max()
+max_expenditures = df_exp_year['Perc_Cost_Sum'].max()
 
 # Set columns
 col1, col2 = st.columns([0.5, 0.5], gap='large')
@@ -68,7 +67,7 @@ with col1:
     fig_world_saf.update_traces(hovertemplate='<b>%{customdata[0]}</b><br>'
                                               '<b>Injuries & deaths per 1B passenger km:</b> %{customdata[1]:,.0f}')
 
-    st.plotly_chart(fig_world_saf, use_container_width=True)
+    budget.plotly_chart(fig_world_saf, use_container_width=True)
 
 with col2:
     st.header('Road infrastructure expenditures')
@@ -76,11 +75,11 @@ with col2:
     # Create world plot expenditures
     fig_world_exp = px.choropleth(df_exp_year,
                                   locations='Location',
-                                  color='Total_Perc',
+                                  color='Perc_Cost_Sum',
                                   color_continuous_scale='Viridis',
                                   projection='orthographic',
                                   range_color=(0, max_expenditures),
-                                  hover_data=['Country', 'Total_Perc']
+                                  hover_data=['Country', 'Perc_Cost_Sum']
                                   )
 
     fig_world_exp.update_layout(title='Percentage of total expenditures spend on road infrastructure',
@@ -91,6 +90,9 @@ with col2:
                                 )\
 
     fig_world_exp.update_traces(hovertemplate='<b>%{customdata[0]}</b><br>'
-                                              '<b>Percentage of total expenditures:</b> %{customdata[1]:,.2f}')
+                                              '<b>Percentage of total expenditures:</b> '
+                                              + hover('Perc_Cost_Sum', 'customdata[1]'))
+
+    budget.plotly_chart(fig_world_exp, use_container_width=True)
 
-    st.plotly_chart(fig_world_exp, use_container_width=True)
+budget.report()
@@ -1,13 +1,20 @@
-import pandas as pd
 import streamlit as st
-import plotly.express as px
-import numpy as np
+import plotly.graph_objs as go
+
+from build_map import load, version
 
 # To run this streamlit application, run in a terminal: streamlit run streamlit_app.py
 
 # Streamlit cheat sheet:
 # https://share.streamlit.io/daniellewisdl/streamlit-cheat-sheet/app.py
 
+
+@st.cache_resource
+def load_figures(key):
+    """Return the stored figures of all years."""
+    return load()
+
+
 # Sets sidebar for streamlit page
 sidebar = st.sidebar
 sidebar.title('European road safety')
@@ -16,52 +23,14 @@ This application shows data about roads in European countries
 and analyses their safety with regards to the countries GDP. 
 """)
 
-# Read in prepared data set, rename a column and extract the different years
-df = pd.read_csv("data/pg_GDP_map.csv")
-df = df.rename(columns={"pg_GDP": "index"})
-years = df.year.unique()
-
-# Calculate max value for continuous colour range
-max_pg_gdp = df['index'].max()
+# Figures of every year, precomputed by build_map.py
+figures = load_figures(version())
+years = figures['years']
 
-# Get year from user and apply to dataset
+# Get year from user and look up its figure
 given_year = st.select_slider('Select year to visualise:', years)
 st.write('You selected the year ' + str(given_year))
-df_new = df.query('year=='+str(given_year))
-customdata = df_new['country']
-
-# Create choropleth figure
-fig = px.choropleth(df_new,
-                    # Iso-alpha-3 codes to signify which country
-                    locations="iso_alpha",
-                    color="index",
-                    hover_name="country",
-                    # Gray represents countries with no available data.
-                    color_continuous_scale=[[0, 'gray'], [0.01, 'gray'], [0.01, 'blue'], [1, 'red']],
-                    projection='miller',
-                    range_color=(0,max_pg_gdp),
-                    scope='europe'
-                    )
-
-# Sets hover data
-fig.update_traces(customdata=customdata,
-                  hovertemplate=np.select([df_new["index"] == 0],
-                                          ["<b>Country: </b> %{customdata}<br><br>No data available"],
-                                          "<b>Country: </b>%{customdata}<br><br><b>Index value: </b>%{z}"))
-
-# Gets value for the entire EU
-numb = df_new.query('country=="EU"')["index"]
-
-# Set title and EU index
-fig.update_layout(title="<b>Volume of passengers relative to GDP in " + str(given_year)
-                        + " (2015 base year)</b><br>EU index: " + str(numb.tolist()[0]),
-                  coloraxis_colorbar=dict(x=0,
-                                          y=0.5)
-                  )
-
-# Set figure size
-fig.update_layout(width=1000,
-                  height=600)
+fig = go.Figure(figures['figures'][str(given_year)])
 
 # Shows figure on streamlit page
 st.plotly_chart(fig)